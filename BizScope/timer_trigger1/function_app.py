@@ -2,23 +2,97 @@
 import datetime
 import logging
 import os
-import requests
-import json
+import asyncio
+import orjson
+from typing import List
+import aiohttp
 import azure.functions as func
 
 # Explicitly configure logging to output to console
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-
-
-def call_weather_api_and_get_data():
-    api_url = os.getenv("PUBLIC_WEATHER_DATA_API_ENDPOINT")
-    api_key = os.getenv("PUBLIC_WEATHER_DATA_API_KEY")
+# 환경변수는 import 시 한 번만 읽어 warm 인스턴스에서 재사용 (필수 값이 없으면 즉시 실패)
+_WEATHER_API_URL = os.environ["PUBLIC_WEATHER_DATA_API_ENDPOINT"]
+_WEATHER_API_KEY = os.environ["PUBLIC_WEATHER_DATA_API_KEY"]
+_SEOUL_POPULATION_API_URL = os.environ["SEOUL_POPULATION_API_ENDPOINT"]
+_SEOUL_POPULATION_API_KEY = os.environ["SEOUL_POPULATION_API_KEY"]
+_SDOT_POPULATION_API_URL = os.environ["SDOT_POPULATION_API_ENDPOINT"]
+_SDOT_POPULATION_API_KEY = os.environ["SDOT_POPULATION_API_KEY"]
+# 행정동 코드표 API는 main()에서 사용하지 않으므로 선택 항목
+_GGINSTCODE_API_URL = os.getenv("GGINSTCODE_API_ENDPOINT")
+_GGINSTCODE_API_KEY = os.getenv("GGINSTCODE_API_KEY")
+
+# 모든 API 호출이 하나의 이벤트 루프와 커넥션 풀을 공유
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+REQUEST_TIMEOUT = aiohttp.ClientTimeout(total=30, sock_connect=3.05)
+
+# 일시적 오류(429, 5xx)에 대한 재시도 설정
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_RETRIES = 3
+BACKOFF_FACTOR = 0.5
+
+# 거의 바뀌지 않는 코드표 API 응답 캐시 (warm 인스턴스에서 조건부 요청에 재사용)
+# (url, params) → {"etag": ..., "last_modified": ..., "body": ...}
+_CONDITIONAL_CACHE = {}
+
+
+def create_session():
+    connector = aiohttp.TCPConnector(limit=8, ttl_dns_cache=300)
+    return aiohttp.ClientSession(
+        headers={"User-Agent": USER_AGENT},
+        timeout=REQUEST_TIMEOUT,
+        connector=connector,
+    )
+
+
+async def _get(session, url, params=None, as_json=False, conditional=False):
+    """
+    GET 요청을 보내고 본문을 text 또는 json으로 반환합니다.
+    429/5xx 응답과 연결 오류·타임아웃은 지수 백오프로 최대 MAX_RETRIES번 재시도합니다.
+    conditional=True이면 이전 응답의 ETag/Last-Modified로 조건부 요청을 보내고,
+    304 Not Modified 응답이면 캐시된 본문을 반환합니다.
+    """
+    cache_key = (url, tuple(sorted((params or {}).items())))
+    headers = {}
+    cached = _CONDITIONAL_CACHE.get(cache_key) if conditional else None
+    if cached:
+        if cached["etag"]:
+            headers["If-None-Match"] = cached["etag"]
+        if cached["last_modified"]:
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            async with session.get(url, params=params, headers=headers) as response:
+                if response.status in RETRY_STATUSES and attempt < MAX_RETRIES:
+                    await asyncio.sleep(BACKOFF_FACTOR * (2 ** attempt))
+                    continue
+                if cached and response.status == 304:
+                    return cached["body"]
+                response.raise_for_status()
+                if as_json:
+                    # 일부 공공 API는 JSON을 text/html로 내려주므로 content-type 검사를 생략
+                    body = await response.json(content_type=None)
+                else:
+                    body = await response.text()
+
+                etag = response.headers.get("ETag")
+                last_modified = response.headers.get("Last-Modified")
+                if conditional and (etag or last_modified):
+                    _CONDITIONAL_CACHE[cache_key] = {"etag": etag, "last_modified": last_modified, "body": body}
+                return body
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+            # 연결 실패·타임아웃도 상태 코드 재시도와 동일하게 백오프 후 재시도
+            if attempt == MAX_RETRIES:
+                raise
+            await asyncio.sleep(BACKOFF_FACTOR * (2 ** attempt))
+
+
+async def call_weather_api_and_get_data(session):
+    api_url = _WEATHER_API_URL
+    api_key = _WEATHER_API_KEY
 
     try:
-        if not api_url or not api_key:
-            raise ValueError("환경변수 PUBLIC_WEATHER_DATA_API_ENDPOINT 또는 PUBLIC_WEATHER_DATA_API_KEY가 설정되지 않았습니다.")
-
         now_utc = datetime.datetime.utcnow()
         one_hour_ago_utc = now_utc - datetime.timedelta(hours=1)
 
@@ -30,14 +104,9 @@ def call_weather_api_and_get_data():
             "authKey": api_key,
         }
 
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-        }
-
-        response = requests.get(api_url, params=params, headers=headers)
-        response.raise_for_status()
+        text_data = await _get(session, api_url, params=params)
         logging.info("날씨 API 호출 성공")
-        return response.text
+        return text_data
 
     except Exception as e:
         logging.error("날씨 API 호출 실패: %s", e)
@@ -45,15 +114,12 @@ def call_weather_api_and_get_data():
 
 
 
-def get_seoul_population_data():
+async def get_seoul_population_data(session):
     logging.info("행정동 단위 서울 생활인구(내국인)")
-    api_url = os.getenv("SEOUL_POPULATION_API_ENDPOINT")
-    api_key = os.getenv("SEOUL_POPULATION_API_KEY")
+    api_url = _SEOUL_POPULATION_API_URL
+    api_key = _SEOUL_POPULATION_API_KEY
 
     try:
-        if not api_url or not api_key:
-            raise ValueError("환경변수 SEOUL_POPULATION_API_ENDPOINT 또는 SEOUL_POPULATION_API_KEY가 설정되지 않았습니다.")
-
         # TODO: Add specific parameters for Seoul Population API if needed
         params = {
             "key": api_key,
@@ -63,49 +129,35 @@ def get_seoul_population_data():
             "endIndex": "10"
         }
 
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-        }
-
-
-        response = requests.get(api_url, params=params, headers=headers)
-        response.raise_for_status()
-        return response.json()
+        return await _get(session, api_url, params=params, as_json=True)
 
     except Exception as e:
         logging.error("서울 생활인구 API 호출 실패: %s", e)
         return None
 
-def get_sdot_floating_population_data():
-    api_url = os.getenv("SDOT_POPULATION_API_ENDPOINT")
-    api_key = os.getenv("SDOT_POPULATION_API_KEY")
+async def get_sdot_floating_population_data(session):
+    api_url = _SDOT_POPULATION_API_URL
+    api_key = _SDOT_POPULATION_API_KEY
     try:
-        if not api_url or not api_key:
-            raise ValueError("환경변수 SDOT_POPULATION_API_ENDPOINT 또는 SDOT_POPULATION_API_KEY가 설정되지 않았습니다.")
         service = "IotVdata018"
         startIndex = "1"
         endIndex = "10"
         
         full_api_url = f"{api_url}/{api_key}/json/{service}/{startIndex}/{endIndex}/"
 
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-        }
-
-        response = requests.get(full_api_url, headers=headers)
-        response.raise_for_status()
+        sdot_data = await _get(session, full_api_url, as_json=True)
         logging.info("S-DoT 유동인구 API 호출 성공")
-        return response.json()
+        return sdot_data
     
     except Exception as e:
         logging.error("S-DoT 유동인구 API 호출 실패: %s", e)
         return None
     return "S-DoT Floating Population Data Placeholder" 
 
-def get_administrative_district_codes():
+async def get_administrative_district_codes(session):
     logging.info("경기도 행정기관 읍면동 단위의 행정동 및 법정동 코드표 API 호출")
-    api_url = os.getenv("GGINSTCODE_API_ENDPOINT")
-    api_key = os.getenv("GGINSTCODE_API_KEY")
+    api_url = _GGINSTCODE_API_URL
+    api_key = _GGINSTCODE_API_KEY
 
     try:
         if not api_url or not api_key:
@@ -118,56 +170,79 @@ def get_administrative_district_codes():
             "pSize": "10"
         }
 
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-        }
-
-        response = requests.get(api_url, params=params, headers=headers)
-        response.raise_for_status()
+        district_codes = await _get(session, api_url, params=params, as_json=True, conditional=True)
         logging.info("경기도 행정기관 읍면동 단위의 행정동 및 법정동 코드표 API 호출 성공")
-        return response.json()
+        return district_codes
 
     except Exception as e:
         logging.error("경기도 행정기관 읍면동 단위의 행정동 및 법정동 코드표 API 호출 실패: %s", e)
         return None
 
-def main(timer_trigger1: func.TimerRequest, outputEventHub: func.Out[str]) -> None:
+async def main(timer_trigger1: func.TimerRequest, outputEventHub: func.Out[List[str]]) -> None:
     utc_timestamp = datetime.datetime.utcnow().isoformat()
     logging.info('Timer trigger executed at %s', utc_timestamp)
 
-    weather_data = call_weather_api_and_get_data()
+    # 서로 독립적인 API 호출을 하나의 이벤트 루프에서 동시에 실행하고, Event Hub 전송은 순차적으로 처리
+    async with create_session() as session:
+        results = await asyncio.gather(
+            call_weather_api_and_get_data(session),
+            get_seoul_population_data(session),
+            get_sdot_floating_population_data(session),
+            return_exceptions=True,
+        )
+    weather_data, seoul_population_data, sdot_floating_population_data = [
+        None if isinstance(result, BaseException) else result for result in results
+    ]
+
+    # Out[str].set()은 호출할 때마다 이전 값을 덮어쓰므로, 메시지를 모아 한 번에 배치 전송
+    # 각 메시지는 {"source": ..., "payload": ...} 형태로 출처를 표시
+    # orjson.dumps는 UTF-8 bytes를 반환하며, Out[List[str]] 바인딩에 맞춰 str로 디코드해서 담음
+    messages: List[str] = []
+
     if weather_data:
-        logging.info("날씨 데이터 Event Hub로 전송: %s", weather_data)
-        outputEventHub.set(weather_data)
-        logging.info("날씨 데이터 Event Hub로 전송 완료")
+        logging.info("날씨 데이터 Event Hub로 전송: %d자, %d줄", len(weather_data), weather_data.count("\n") + 1)
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug("날씨 데이터 본문: %s", weather_data)
+        messages.append(orjson.dumps({"source": "weather", "payload": weather_data}).decode())
     else:
         logging.warning("날씨 데이터를 가져오지 못하여 Event Hub로 전송하지 않습니다.")
 
-
-    seoul_population_data = get_seoul_population_data()
     if seoul_population_data:
-        seoul_population_json = json.dumps(seoul_population_data)
-        logging.info("서울 생활인구 데이터 Event Hub로 전송: %s", seoul_population_json)
-        outputEventHub.set(seoul_population_json)
-        logging.info("서울 생활인구 데이터 Event Hub로 전송 완료")
+        seoul_population_json = orjson.dumps({"source": "seoul_population", "payload": seoul_population_data})
+        logging.info(
+            "서울 생활인구 데이터 Event Hub로 전송: %d bytes, %d건",
+            len(seoul_population_json),
+            len(seoul_population_data.get("SPOP_LOCAL_RESD_DONG", {}).get("row", [])),
+        )
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug("서울 생활인구 데이터 본문: %s", seoul_population_json.decode())
+        messages.append(seoul_population_json.decode())
     else:
         logging.warning("서울 생활인구 데이터를 가져오지 못하여 Event Hub로 전송하지 않습니다.")
 
-    sdot_floating_population_data = get_sdot_floating_population_data()
     if sdot_floating_population_data:
-        sdot_floating_population_json = json.dumps(sdot_floating_population_data)
-        logging.info("스마트서울 도시데이터 센서(S-DoT) 유동인구 데이터 Event Hub로 전송: %s", sdot_floating_population_json)
-        outputEventHub.set(sdot_floating_population_json)
-        logging.info("스마트서울 도시데이터 센서(S-DoT) 유동인구 데이터 Event Hub로 전송 완료")
+        sdot_floating_population_json = orjson.dumps({"source": "sdot_floating_population", "payload": sdot_floating_population_data})
+        logging.info(
+            "스마트서울 도시데이터 센서(S-DoT) 유동인구 데이터 Event Hub로 전송: %d bytes, %d건",
+            len(sdot_floating_population_json),
+            len(sdot_floating_population_data.get("IotVdata018", {}).get("row", [])),
+        )
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug("스마트서울 도시데이터 센서(S-DoT) 유동인구 데이터 본문: %s", sdot_floating_population_json.decode())
+        messages.append(sdot_floating_population_json.decode())
     else:
         logging.warning("스마트서울 도시데이터 센서(S-DoT) 유동인구 데이터를 가져오지 못하여 Event Hub로 전송하지 않습니다.")
 
+    if messages:
+        outputEventHub.set(messages)
+        logging.info("Event Hub로 %d건 배치 전송 완료", len(messages))
+
     
     # MS ADLS Parquet 파일 가져오려다 취소.
     # conversation Table 만들어서 DB 쿼리하게 FK 참조하는 구조로 수정
     # administrative_district_codes_data = get_administrative_district_codes()
     # if administrative_district_codes_data:
-    #    administrative_district_codes_json = json.dumps(administrative_district_codes_data)
+    #    administrative_district_codes_json = orjson.dumps(administrative_district_codes_data)
     #    logging.info("경기도 행정기관 읍면동 단위의 행정동 및 법정동 코드표 데이터 Event Hub로 전송: %s", administrative_district_codes_json)
     #    outputEventHub.set(administrative_district_codes_json)
     #    logging.info("경기도 행정기관 읍면동 단위의 행정동 및 법정동 코드표 데이터 Event Hub로 전송 완료")
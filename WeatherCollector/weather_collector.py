@@ -4,6 +4,7 @@ import requests
 import pandas as pd
 import io
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
 from azure.storage.blob import BlobServiceClient
 
@@ -18,6 +19,10 @@ COLUMNS = [
     "SD_NEW", "SD_NEW_TM", "SD_MAX", "SD_MAX_TM", "TE_05", "TE_10", "TE_15", "TE_30", "TE_50"
 ]
 
+# 컬럼별 dtype: 관측값은 float32, 시각(HHMM)·지점번호·일자(YYYYMMDD)는 int32
+WEATHER_DTYPES = {col: "int32" if col.endswith("_TM") else "float32" for col in COLUMNS}
+WEATHER_DTYPES.update({"TM": "int32", "STN": "int32"})
+
 # .env에서 로드
 load_dotenv()
 account_name = os.getenv("AZURE_STORAGE_ACCOUNT_NAME")
@@ -34,25 +39,30 @@ def parse_weather_text(text_data: str) -> pd.DataFrame:
     월별 텍스트 데이터를 받아 DataFrame으로 변환합니다.
     주석(#)과 설명 라인은 제거하고 실제 데이터만 변환합니다.
     """
-    # 텍스트를 줄 단위로 분리
-    lines = text_data.splitlines()
-    
-    # 주석(#) 제거
-    data_lines = [line for line in lines if line.strip() and not line.startswith("#")]
-    
-    # 공백 여러개를 단일 공백으로 변경
-    data_lines = [" ".join(line.split()) for line in data_lines]
-    
-    # 문자열을 CSV처럼 읽어서 DataFrame 생성
-    csv_like = "\n".join(data_lines)
-    df = pd.read_csv(io.StringIO(csv_like), sep="\s+", header=None, names=COLUMNS, engine='python')
-    
-    return df
-
-# .env 파일에서 환경 변수 로드
-load_dotenv()
+    # 주석(#) 제거와 연속 공백 구분을 pandas C 엔진에서 한 번에 처리
+    # (pyarrow.csv는 단일 문자 구분자만 지원해 공백 정규화를 Python에서 해야 하므로 오히려 느림)
+    return pd.read_csv(
+        io.StringIO(text_data),
+        sep=r"\s+",
+        header=None,
+        names=COLUMNS,
+        dtype=WEATHER_DTYPES,
+        comment="#",
+        skip_blank_lines=True,
+        engine="c",
+    )
+
+
 API_KEY = os.getenv("API_KEY")
 BASE_URL = "https://apihub.kma.go.kr/api/typ01/url/kma_sfcdd3.php"
+LOCATION_CODE = 0  # 전체 관측소
+
+# 월별 병렬 수집 시 기상청 API 커넥션을 재사용하기 위한 공유 세션
+session = requests.Session()
+
+# 저장 포맷: 기본은 Parquet(Snappy), CSV가 필요한 소비자가 있으면 OUTPUT_FORMAT=csv
+OUTPUT_FORMAT = os.getenv("OUTPUT_FORMAT", "parquet").lower()
+FILE_EXT = "csv" if OUTPUT_FORMAT == "csv" else "parquet"
 
 def get_weather_data_monthly(year, month, location_code=0):
     """
@@ -75,7 +85,7 @@ def get_weather_data_monthly(year, month, location_code=0):
 
     for attempt in range(3):  # 3번 재시도
         try:
-            response = requests.get(BASE_URL, params=params, timeout=100)
+            response = session.get(BASE_URL, params=params, timeout=100)
             response.raise_for_status()
             text_data = response.text
             print(f"{start_date} ~ {end_date} : 데이터 가져오기 성공")
@@ -87,74 +97,97 @@ def get_weather_data_monthly(year, month, location_code=0):
     print(f"{start_date} ~ {end_date} : 3번의 시도에도 불구하고 데이터 가져오기 실패.")
     return None
 
-def save_data_to_csv(dataframe, start_date, location_code):
+def save_data_to_buffer(dataframe):
     """
-    데이터프레임을 CSV 파일로 저장합니다. 파일이 이미 존재하면 저장하지 않고 경로를 반환합니다.
+    데이터프레임을 Parquet(Snappy) 형식의 메모리 버퍼로 직렬화합니다. OUTPUT_FORMAT=csv이면 CSV로 직렬화합니다.
+    로컬 디스크를 거치지 않고 바로 업로드할 수 있도록 BytesIO를 반환합니다.
     """
     if dataframe is None:
         print("저장할 데이터가 없습니다.")
         return None
 
-    if not os.path.exists('data'):
-        os.makedirs('data')
-
-    filename = f"data/{start_date}-{location_code}.csv"
-    
-    if os.path.exists(filename):
-        print(f"'{filename}' 파일이 이미 존재합니다. 저장을 건너뜁니다.")
-        return filename
-
     try:
-        dataframe.to_csv(filename, index=False, encoding='utf-8-sig')
-        print(f"데이터를 '{filename}' 파일에 저장했습니다.")
-        return filename
+        buf = io.BytesIO()
+        if FILE_EXT == "csv":
+            dataframe.to_csv(buf, index=False, encoding='utf-8-sig')
+        else:
+            dataframe.to_parquet(buf, engine="pyarrow", compression="snappy", index=False)
+        buf.seek(0)
+        return buf
     except Exception as e:
-        print(f"파일 저장 중 오류가 발생했습니다: {e}")
+        print(f"데이터 직렬화 중 오류가 발생했습니다: {e}")
         return None
 
 
-def upload_to_data_lake(file_path, blob_name):
+def upload_to_data_lake(buf, blob_name):
     """
-    CSV 파일을 Azure Data Lake 컨테이너에 업로드합니다.
+    메모리 버퍼의 데이터를 Azure Data Lake 컨테이너에 업로드합니다.
+    업로드했으면 True, 업로드할 데이터가 없으면 False를 반환합니다.
     """
-    if not os.path.exists(file_path):
-        print(f"{file_path} 파일이 존재하지 않습니다.")
-        return
+    if buf is None:
+        print(f"{blob_name} : 업로드할 데이터가 없습니다.")
+        return False
+
+    # 크기를 미리 알려주면 SDK가 길이 확인 없이 블록 단위 병렬 업로드를 수행
+    container_client.upload_blob(
+        name=blob_name,
+        data=buf,
+        overwrite=True,
+        max_concurrency=4,
+        length=buf.getbuffer().nbytes,
+    )
+    print(f"{blob_name} 업로드 완료")
+    return True
 
 
-    with open(file_path, "rb") as data:
-        container_client.upload_blob(name=blob_name, data=data, overwrite=True)
-    print(f"{blob_name} 업로드 완료")
+def process_month(task):
+    """
+    (연도, 월) 단위로 데이터 수집 → 파싱 → 직렬화 → 업로드를 수행합니다.
+    성공하면 True, 데이터를 가져오지 못했거나 업로드할 데이터가 없으면 False를 반환합니다.
+    """
+    year, month = task
+    monthly_data = get_weather_data_monthly(year, month, LOCATION_CODE)
+    if not monthly_data:
+        return False
+
+    # 주석 제거하고 컬럼 적용
+    weather_df = parse_weather_text(monthly_data)
+
+    # 첫 번째 행만 확인용 출력
+    first_row = weather_df.iloc[0]
+    print(first_row.tolist())
+    print(f"총 항목 수: {len(first_row)}")  # 56이어야 함
+
+    # 메모리 버퍼로 직렬화
+    start_dt = f"Weather_{year}{month:02d}01"
+    buf = save_data_to_buffer(weather_df)
 
+    # 데이터 레이크 업로드
+    blob_name = f"bronze/Weather/{year}/{start_dt}-{LOCATION_CODE}.{FILE_EXT}"
+    return upload_to_data_lake(buf, blob_name)
 
 
 if __name__ == "__main__":
     print("기상 데이터 수집을 시작합니다.")
 
-    location_code = 0  # 전체 관측소
-    for year in range(2022, 2026):
-        start_month = 1
-        end_month = 12
-        if year == 2025:
-            end_month = 10  # 2025년은 10월까지만
-
-        for month in range(start_month, end_month + 1):
-            monthly_data = get_weather_data_monthly(year, month, location_code)
-            if monthly_data:
-                # 주석 제거하고 컬럼 적용
-                weather_df = parse_weather_text(monthly_data)
-                
-                # 첫 번째 행만 확인용 출력
-                first_row = weather_df.iloc[0]
-                print(first_row.tolist())
-                print(f"총 항목 수: {len(first_row)}")  # 56이어야 함
-
-                # CSV 파일 저장
-                start_dt = f"Weather_{year}{month:02d}01"
-                file_path = save_data_to_csv(weather_df, start_dt, location_code)
-
-                # 데이터 레이크 업로드
-                blob_name = f"bronze/Weather/{year}/{start_dt}-{location_code}.csv"
-                upload_to_data_lake(file_path, blob_name)
-
-    print("기상 데이터 수집을 종료합니다.")
\ No newline at end of file
+    # 2022년 1월 ~ 2025년 10월 (2025년은 10월까지만)
+    tasks = [(year, month) for year in range(2022, 2026) for month in range(1, 13 if year < 2025 else 11)]
+
+    # 월별 작업은 서로 독립적이므로 API 호출과 업로드를 병렬로 수행
+    # 한 달이 실패해도 나머지는 계속 진행하고, 재실행이 필요한 (연도, 월)을 모아서 보고
+    failed = []
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        futures = {executor.submit(process_month, task): task for task in tasks}
+        for future in as_completed(futures):
+            year, month = futures[future]
+            try:
+                if not future.result():
+                    failed.append((year, month))
+            except Exception as e:
+                print(f"{year}-{month:02d} : 처리 중 오류 발생 - {e!r}")
+                failed.append((year, month))
+
+    if failed:
+        print(f"재실행이 필요한 월 ({len(failed)}건): " + ", ".join(f"{y}-{m:02d}" for y, m in sorted(failed)))
+
+    print("기상 데이터 수집을 종료합니다.")
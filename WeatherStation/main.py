@@ -1,61 +1,114 @@
 import os
 import io
+import re
 import requests
+from requests.adapters import HTTPAdapter
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from dotenv import load_dotenv
+from azure.core import MatchConditions
+from azure.core.exceptions import HttpResponseError
 from azure.storage.blob import BlobServiceClient
 from datetime import datetime
 
+# .env 파일에서 환경 변수 로드
+load_dotenv()
 
-def read_parquet_from_adls(connection_string, container_name, blob_path):
+# ADLS 클라이언트는 모듈 로드 시 한 번만 생성해 재사용
+_BLOB_SERVICE_CLIENT = BlobServiceClient.from_connection_string(os.environ["AZURE_STORAGE_CONNECTION_STRING"])
+_CONTAINER_CLIENT = _BLOB_SERVICE_CLIENT.get_container_client(os.environ["AZURE_CONTAINER_NAME"])
+
+GEOCODE_WORKERS = 16
+
+# 기상청 지상 관측소 정보 API (인증키는 params로 전달)
+_STN_URL = "https://apihub.kma.go.kr/api/typ01/url/stn_inf.php"
+_KMA_SESSION = requests.Session()
+
+# SGIS API 호출이 공유하는 세션 (병렬 리버스 지오코딩 시 keep-alive 커넥션 재사용)
+_SGIS_SESSION = requests.Session()
+_SGIS_SESSION.mount("https://", HTTPAdapter(pool_maxsize=GEOCODE_WORKERS))
+
+STN_HEADERS = [
+    "STN_ID","LON","LAT","STN_SP","HT","HT_PA","HT_TA",
+    "HT_WD","HT_RN","STN_CD","STN_KO","STN_EN","FCT_ID","LAW_ID","BASIN"
+]
+
+# 관측소 한 줄: 앞의 10개 숫자 필드 + 한글 지점명 + (공백 포함 가능한) 영문 지점명 + 뒤의 3개 코드 필드
+_STN_LINE_RE = re.compile(
+    r"^\s*" + r"(\S+)\s+" * 10 + r"(\S+)(?:\s+(.*?))?\s+(\S+)\s+(\S+)\s+(\S+)\s*$"
+)
+
+# ADLS Parquet 캐시: Blob 경로 → (ETag, DataFrame)
+_PARQUET_CACHE = {}
+
+# 주석(#) 줄 제거용 정규식 (앞쪽 공백 허용)
+_COMMENT_RE = re.compile(r"(?m)^[ \t]*#.*\n?")
+
+# SGIS AccessToken 보관소 (토큰이 바뀌어도 리버스 지오코딩 캐시 키에 영향을 주지 않도록 분리)
+_SGIS_AUTH = {"access_token": None}
+
+
+def read_parquet_from_adls(blob_path):
     """
     Azure Data Lake Storage에서 Parquet 파일을 읽어 Pandas DataFrame으로 반환합니다.
+    Blob의 ETag가 이전과 같으면 다시 내려받지 않고 캐시된 DataFrame의 복사본을 반환합니다.
     
-    :param connection_string: Azure Storage 연결 문자열
-    :param container_name: 컨테이너 이름
     :param blob_path: Parquet 파일의 Blob 경로
     :return: Pandas DataFrame
     """
     try:
-        blob_service_client = BlobServiceClient.from_connection_string(connection_string)
-        container_client = blob_service_client.get_container_client(container_name)
-        
-        blob_client = container_client.get_blob_client(blob_path)
-        download_stream = blob_client.download_blob()
+        blob_client = _CONTAINER_CLIENT.get_blob_client(blob_path)
+
+        # 정적 룩업 테이블이므로 캐시된 ETag로 조건부 다운로드 (변경 없으면 304)
+        cached = _PARQUET_CACHE.get(blob_path)
+        if cached is None:
+            download_stream = blob_client.download_blob()
+        else:
+            try:
+                download_stream = blob_client.download_blob(
+                    etag=cached[0], match_condition=MatchConditions.IfModified
+                )
+            except HttpResponseError as e:
+                # Storage SDK는 304 Not Modified를 일반 HttpResponseError로 올려보냄
+                if e.status_code != 304:
+                    raise
+                print("✅ ADLS Parquet 데이터 변경 없음, 캐시 사용")
+                return cached[1].copy()
+
         parquet_bytes = download_stream.readall()
         
         df = pd.read_parquet(io.BytesIO(parquet_bytes))
+        _PARQUET_CACHE[blob_path] = (download_stream.properties.etag, df)
         
         print("✅ ADLS에서 Parquet 데이터 읽기 완료! 미리보기:")
         print(df.head())
         
-        output_path = "region_lookup_preview.csv"
-        df.to_csv(output_path, index=False)
-        print(f"\n💾 CSV 파일로 저장 완료: {output_path}")
-        
-        return df
+        # 호출자가 수정해도 캐시가 오염되지 않도록 복사본 반환
+        return df.copy()
     except Exception as e:
         print(f"❌ ADLS에서 데이터 읽기 오류: {e}")
         return None
 
-def upload_csv_to_adls(connection_string, container_name, local_file_path, blob_path):
+def upload_csv_to_adls(local_file_path, blob_path):
     """
     로컬 CSV 파일을 Azure Data Lake Storage에 업로드합니다.
 
-    :param connection_string: Azure Storage 연결 문자열
-    :param container_name: 컨테이너 이름
     :param local_file_path: 업로드할 로컬 CSV 파일 경로
     :param blob_path: ADLS에 저장될 Blob 경로
     """
     try:
-        blob_service_client = BlobServiceClient.from_connection_string(connection_string)
-        container_client = blob_service_client.get_container_client(container_name)
-        blob_client = container_client.get_blob_client(blob_path)
+        blob_client = _CONTAINER_CLIENT.get_blob_client(blob_path)
 
         with open(local_file_path, "rb") as data:
-            blob_client.upload_blob(data, overwrite=True)
-
-        print(f"✅ 로컬 파일 '{local_file_path}'을 ADLS '{container_name}/{blob_path}'에 성공적으로 업로드했습니다.")
+            blob_client.upload_blob(
+                data,
+                overwrite=True,
+                max_concurrency=4,
+                length=os.path.getsize(local_file_path),
+            )
+
+        print(f"✅ 로컬 파일 '{local_file_path}'을 ADLS '{_CONTAINER_CLIENT.container_name}/{blob_path}'에 성공적으로 업로드했습니다.")
     except Exception as e:
         print(f"❌ ADLS에 파일 업로드 오류: {e}")
 
@@ -63,33 +116,17 @@ def parse_weather_text(text):
     """
     기상청 API 응답 텍스트를 파싱하여 DataFrame으로 변환합니다.
     """
-    lines = [line for line in text.splitlines() if line.strip() and not line.startswith("#")]
-    rows = []
-
-    for line in lines:
-        parts = line.split()
-        # 앞의 10개 숫자 필드
-        fixed = parts[:10]
-        # 뒤의 3개 코드 필드
-        tail = parts[-3:]
-        # 중간에 남은 것들: 한글 지점명 + 영문 지점명
-        middle = parts[10:-3]
-
-        if len(middle) >= 2:
-            stn_ko = middle[0]
-            stn_en = " ".join(middle[1:])  # 영문 지점명은 공백 포함 가능
-        else:
-            stn_ko = middle[0]
-            stn_en = ""
+    lines = pd.Series([line for line in text.splitlines() if line.strip() and not line.startswith("#")], dtype=object)
+
+    # 한 줄 전체를 정규식 한 번으로 15개 컬럼으로 분리
+    df = lines.str.extract(_STN_LINE_RE)
+    df.columns = STN_HEADERS
 
-        row = fixed + [stn_ko, stn_en] + tail
-        rows.append(row)
+    # 형식이 맞지 않는 줄은 제외
+    df = df.dropna(subset=["STN_ID"]).reset_index(drop=True)
 
-    headers = [
-        "STN_ID","LON","LAT","STN_SP","HT","HT_PA","HT_TA",
-        "HT_WD","HT_RN","STN_CD","STN_KO","STN_EN","FCT_ID","LAW_ID","BASIN"
-    ]
-    df = pd.DataFrame(rows, columns=headers)
+    # 영문 지점명은 공백 포함 가능 (없으면 빈칸)
+    df["STN_EN"] = df["STN_EN"].fillna("").str.replace(r"\s+", " ", regex=True)
     return df
 
 
@@ -99,17 +136,20 @@ def get_weather_data(auth_key, timestamp):
     """
     print(f"\n🔹 기상청 API에서 데이터 가져오는 중... (시각: {timestamp})")
 
-    api_endpoint = f"https://apihub.kma.go.kr/api/typ01/url/stn_inf.php?inf=SFC&stn=0&tm={timestamp}"
-    api_url = f"{api_endpoint}&help=0&authKey={auth_key}"
+    params = {
+        "inf": "SFC",
+        "stn": 0,
+        "tm": timestamp,
+        "help": 0,
+        "authKey": auth_key,
+    }
 
     try:
-        response = requests.get(api_url)
+        response = _KMA_SESSION.get(_STN_URL, params=params, timeout=(3.05, 30))
         response.raise_for_status()
 
         # 주석(#) 제거
-        content = response.text
-        lines = [line for line in content.split('\n') if not line.strip().startswith('#')]
-        csv_content = '\n'.join(lines)
+        csv_content = _COMMENT_RE.sub('', response.text)
 
         if not csv_content.strip():
             print("⚠️ API 응답에 데이터가 없습니다.")
@@ -124,7 +164,8 @@ def get_weather_data(auth_key, timestamp):
         return weather_df
 
     except requests.exceptions.RequestException as e:
-        print(f"❌ API 호출 오류: {e}")
+        # 오류 메시지에 포함된 요청 URL에서 인증키 제거
+        print(f"❌ API 호출 오류: {str(e).replace(auth_key, '***')}")
         return None
     except Exception as e:
         print(f"❌ 데이터 파싱 오류: {e}")
@@ -139,41 +180,53 @@ def get_access_token(consumer_key: str, consumer_secret: str) -> str:
         "consumer_key": consumer_key,
         "consumer_secret": consumer_secret
     }
-    res = requests.get(url, params=params)
+    res = _SGIS_SESSION.get(url, params=params)
     res.raise_for_status()
     data = res.json()
     return data["result"]["accessToken"]
 
 
+class SgisApiError(Exception):
+    """
+    SGIS API가 HTTP 200과 함께 errCd != 0을 반환한 경우
+    """
+    def __init__(self, payload: dict):
+        super().__init__(payload.get("errMsg", ""))
+        self.payload = payload
+
+
 def reverse_geocode(access_token: str, lon: float, lat: float, addr_type: int = 20) -> dict:
     """
     SGIS 리버스 지오코딩 (좌표 → 주소)
     addr_type: 10=지번주소, 20=도로명주소
+    관측소 좌표는 고정값이므로 (lon, lat, addr_type) 기준으로 성공 응답만 메모이제이션합니다.
     """
+    _SGIS_AUTH["access_token"] = access_token
+    try:
+        return _reverse_geocode_cached(round(float(lon), 5), round(float(lat), 5), addr_type)
+    except SgisApiError as e:
+        # 인증·쿼터 오류 등은 캐시하지 않고 응답만 그대로 반환
+        print(f"⚠️ SGIS 리버스 지오코딩 오류 ({lon}, {lat}): errCd={e.payload.get('errCd')} {e.payload.get('errMsg', '')}")
+        return e.payload
+
+
+@lru_cache(maxsize=4096)
+def _reverse_geocode_cached(lon: float, lat: float, addr_type: int) -> dict:
     url = "https://sgisapi.kostat.go.kr/OpenAPI3/addr/rgeocodewgs84.json"
     params = {
-        "accessToken": access_token,
+        "accessToken": _SGIS_AUTH["access_token"],
         "x_coor": lon,
         "y_coor": lat,
         "addr_type": addr_type
     }
-    res = requests.get(url, params=params)
+    res = _SGIS_SESSION.get(url, params=params)
     res.raise_for_status()
-    print(res.json())
-    return res.json()
-
-
-def reverse_geocode_df(access_token: str, lon: float, lat: float, addr_type: int = 20) -> pd.DataFrame:
-    """
-    SGIS 리버스 지오코딩 결과를 DataFrame으로 반환
-    """
-    rgeo_json = reverse_geocode(access_token, lon, lat, addr_type)
-
-    if "result" in rgeo_json and isinstance(rgeo_json["result"], list):
-        return pd.DataFrame(rgeo_json["result"])
-    else:
-        return pd.DataFrame()  # 실패 시 빈 DF
+    data = res.json()
 
+    # SGIS는 인증·쿼터 오류도 HTTP 200으로 응답하므로, 예외를 던져 lru_cache에 저장되지 않게 함
+    if str(data.get("errCd")) != "0":
+        raise SgisApiError(data)
+    return data
 
 
 def geocode(access_token: str, address: str, pagenum: int = 0, resultcount: int = 5) -> dict:
@@ -187,7 +240,7 @@ def geocode(access_token: str, address: str, pagenum: int = 0, resultcount: int
         "pagenum": pagenum,
         "resultcount": resultcount
     }
-    res = requests.get(url, params=params)
+    res = _SGIS_SESSION.get(url, params=params)
     res.raise_for_status()
     return res.json()
 
@@ -221,26 +274,29 @@ def enrich_weather_data(weather_df, access_token):
     - emdong_nm → 읍/면/동 이름 (없으면 빈칸)
     - full_addr → 전체 주소
     """
-    for col in ["도", "시군구", "읍면동", "전체주소"]:
-        weather_df[col] = ""
-
-    for idx, row in weather_df.iterrows():
-        lon, lat = row["LON"], row["LAT"]
-
-        # 리버스 지오코딩 호출 → DataFrame 반환
-        rgeo_df = reverse_geocode_df(access_token, lon, lat, addr_type=20)
-
-        if not rgeo_df.empty:
-            sido_nm   = rgeo_df.loc[0, "sido_nm"]   if "sido_nm"   in rgeo_df.columns else ""
-            sgg_nm    = rgeo_df.loc[0, "sgg_nm"]    if "sgg_nm"    in rgeo_df.columns else ""
-            emdong_nm = rgeo_df.loc[0, "emdong_nm"] if "emdong_nm" in rgeo_df.columns else ""
-            full_addr = rgeo_df.loc[0, "full_addr"] if "full_addr" in rgeo_df.columns else ""
-
-            # weather_df에 값 추가
-            weather_df.at[idx, "도"] = sido_nm
-            weather_df.at[idx, "시군구"] = sgg_nm if sgg_nm else ""
-            weather_df.at[idx, "읍면동"] = emdong_nm if emdong_nm else ""
-            weather_df.at[idx, "전체주소"] = full_addr
+    def lookup_address(coord):
+        lon, lat = coord
+
+        # 리버스 지오코딩 호출 → 첫 번째 결과(dict)만 사용
+        rgeo_json = reverse_geocode(access_token, lon, lat, addr_type=20)
+        result = rgeo_json.get("result") or {}
+        if isinstance(result, list):
+            result = result[0] if result else {}
+
+        return {
+            "도": result.get("sido_nm") or "",
+            "시군구": result.get("sgg_nm") or "",
+            "읍면동": result.get("emdong_nm") or "",
+            "전체주소": result.get("full_addr") or "",
+        }
+
+    # 관측소별 리버스 지오코딩을 병렬로 호출한 뒤 한 번에 컬럼 할당
+    coords = list(zip(weather_df["LON"], weather_df["LAT"]))
+    with ThreadPoolExecutor(max_workers=GEOCODE_WORKERS) as executor:
+        rows = list(executor.map(lookup_address, coords))
+
+    address_cols = ["도", "시군구", "읍면동", "전체주소"]
+    weather_df[address_cols] = pd.DataFrame(rows, index=weather_df.index, columns=address_cols)
 
     return weather_df
 
@@ -248,29 +304,23 @@ def enrich_weather_data(weather_df, access_token):
 
 
 def main():
-    # .env 파일에서 환경 변수 로드
-    load_dotenv()
-
     # 1. AccessToken 발급
     token = get_access_token("433f72dd0d464fab94d1", "bde93ac5b0e6428c84ee")
 
     # 환경 변수 로드 및 검증
-    connection_string = os.getenv('AZURE_STORAGE_CONNECTION_STRING')
-    container_name = os.getenv('AZURE_CONTAINER_NAME')
     kma_auth_key = os.getenv('KMA_API_AUTH_KEY')
     blob_Gold_path = "gold/lookup_tables/region_lookup/region_lookup.parquet"
     blob_Silver_path = "silver/"
 
-    if not all([connection_string, container_name, kma_auth_key]):
+    # AZURE_STORAGE_CONNECTION_STRING, AZURE_CONTAINER_NAME은 모듈 로드 시 검증됨
+    if not kma_auth_key:
         print("❌ 필수 환경 변수가 설정되지 않았습니다. (.env 파일을 확인하세요)")
-        print("   - AZURE_STORAGE_CONNECTION_STRING")
-        print("   - AZURE_CONTAINER_NAME")
         print("   - KMA_API_AUTH_KEY")
         return
     
     # ADLS에서 Parquet 데이터 읽기
     # print("🔹 Azure Data Lake에서 Parquet 데이터 읽는 중...")
-    # region_df = read_parquet_from_adls(connection_string, container_name, blob_Gold_path)
+    # region_df = read_parquet_from_adls(blob_Gold_path)
 
     # if region_df is not None:
     #     print("\n📊 지역 데이터 요약:")
@@ -291,7 +341,7 @@ def main():
         enriched_df.to_csv(output_filename, index=False, encoding='utf-8-sig')
         print(f"\n💾 위치와 주소가 추가된 날씨 관측소 데이터 CSV 파일로 저장 완료: {output_filename}")
         
-        upload_csv_to_adls(connection_string, container_name, output_filename, blob_Silver_path)
+        upload_csv_to_adls(output_filename, blob_Silver_path)
     else:
         print("⚠️ 날씨 관측소 데이터를 불러오지 못했습니다.")
 